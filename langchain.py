@@ -19,25 +19,27 @@ from langchain_openai import OpenAI
 from langchain.prompts import PromptTemplate
 from daytona_sdk import Daytona, DaytonaConfig, CreateWorkspaceParams
 import os
+import atexit
+import logging
+import functools
+import threading
 from dotenv import load_dotenv
 
-# Load environment variables from .env file
-load_dotenv()
+# Load environment variables from .env file, once per process tree
+if not os.getenv("_DOTENV_LOADED"):
+    load_dotenv()
+    os.environ["_DOTENV_LOADED"] = "1"
 
-# Get required API keys and URLs from environment variables
-if not os.getenv("OPENAI_API_KEY"):
-    raise ValueError("OPENAI_API_KEY not found in environment variables")
-if not os.getenv("DAYTONA_API_KEY"):
-    raise ValueError("DAYTONA_API_KEY not found in environment variables")
-if not os.getenv("DAYTONA_SERVER_URL"):
-    raise ValueError("DAYTONA_SERVER_URL not found in environment variables")
+log = logging.getLogger("babyagi")
 
-# Get the required environment variables with type checking
-daytona_api_key = os.getenv("DAYTONA_API_KEY")
-daytona_server_url = os.getenv("DAYTONA_SERVER_URL")
-
-if not daytona_api_key or not daytona_server_url:
-    raise ValueError("Missing required environment variables")
+def _require_env(name: str) -> str:
+    """
+    Return a required environment variable, raising if it is missing.
+    """
+    value = os.getenv(name)
+    if not value:
+        raise ValueError(f"{name} not found in environment variables")
+    return value
 
 # Create a prompt template for code generation
 code_generation_prompt = PromptTemplate(
@@ -56,50 +58,85 @@ Code:
 """
 )
 
-# Initialize the LLM with lower temperature for more focused code generation
-llm = OpenAI(
-    temperature=0.2,
-    max_tokens=1000
-)
-
-# Create the code generation chain using RunnableSequence
-code_chain = code_generation_prompt | llm
+@functools.lru_cache(maxsize=1)
+def _get_code_chain():
+    """
+    Build the code generation chain on first use, so importing this module doesn't require OpenAI credentials.
+    """
+    _require_env("OPENAI_API_KEY")
+    # Initialize the LLM with lower temperature for more focused code generation
+    llm = OpenAI(
+        temperature=0.2,
+        max_tokens=1000
+    )
+    # Create the code generation chain using RunnableSequence
+    return code_generation_prompt | llm
 
 def generate_code(language: str, task: str):
     """
     Generate code for a given task in the specified programming language.
     """
-    return code_chain.invoke({
+    return _get_code_chain().invoke({
         "language": language,
         "task": task
     })
 
-def execute_in_sandbox(code: str):
+# Workspaces are expensive to provision, so keep one per language for the life of the process
+_workspace_cache = {}
+_workspace_locks = {}
+_workspace_cache_lock = threading.Lock()
+
+@functools.lru_cache(maxsize=1)
+def _get_daytona():
     """
-    Execute generated code in a Daytona workspace sandbox.
+    Build the Daytona client on first use, validating its configuration.
     """
     # Initialize Daytona with your configuration
     config = DaytonaConfig(
-        api_key=str(daytona_api_key),
-        server_url=str(daytona_server_url),
+        api_key=_require_env("DAYTONA_API_KEY"),
+        server_url=_require_env("DAYTONA_SERVER_URL"),
         target="local"
     )
-    daytona = Daytona(config=config)
+    return Daytona(config=config)
 
-    # Create a Python workspace
-    params = CreateWorkspaceParams(language="python")
-    workspace = daytona.create(params=params)
+def _get_workspace(language: str):
+    """
+    Return the cached workspace for a language, creating it on first use.
+    """
+    with _workspace_cache_lock:
+        if language not in _workspace_cache:
+            params = CreateWorkspaceParams(language=language)
+            _workspace_cache[language] = _get_daytona().create(params=params)
+            _workspace_locks[language] = threading.Lock()
+        return _workspace_cache[language], _workspace_locks[language]
+
+def _cleanup_workspaces():
+    """
+    Remove every cached workspace. Registered to run at interpreter shutdown.
+    """
+    while _workspace_cache:
+        _, workspace = _workspace_cache.popitem()
+        try:
+            _get_daytona().remove(workspace)
+        except Exception as e:
+            log.warning("Failed to remove workspace: %s", e)
+
+atexit.register(_cleanup_workspaces)
+
+def execute_in_sandbox(code: str):
+    """
+    Execute generated code in a Daytona workspace sandbox.
+    """
+    workspace, lock = _get_workspace("python")
 
-    try:
-        # Execute the code in the sandbox
+    # code_run starts a fresh interpreter per call, so snippets don't share globals;
+    # the lock only serializes concurrent callers on the shared workspace
+    with lock:
         response = workspace.process.code_run(code)
 
-        if response.code != 0:
-            return f"Error: {response.code} {response.result}"
-        return response.result
-    finally:
-        # Always clean up the workspace
-        daytona.remove(workspace)
+    if response.code != 0:
+        return f"Error: {response.code} {response.result}"
+    return response.result
 
 # Example usage
 if __name__ == "__main__":
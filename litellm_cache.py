@@ -0,0 +1,181 @@
+"""
+Semantic response cache for litellm completions.
+
+Responses are stored in a local sqlite database next to an embedding of the
+prompt that produced them. When a later request is semantically close to a
+cached one (cosine similarity above SIMILARITY_THRESHOLD) the stored response
+is returned instead of calling the model again.
+
+Entries are scoped by model, tool names and an exact hash of the whole
+conversation before the last message, so only the last message is matched
+semantically and a repeated tool result later in a run never replays the reply
+given at an earlier step.
+
+The cache is opt-in (BABYAGI_CACHE=1): every miss waits for an embedding call.
+"""
+
+import os
+import json
+import logging
+import math
+import secrets
+import sqlite3
+import hashlib
+import threading
+from litellm import completion, acompletion, embedding, aembedding, ModelResponse
+
+CACHE_ENABLED = os.getenv("BABYAGI_CACHE", "0") == "1"
+CACHE_PATH = os.getenv("BABYAGI_CACHE_PATH", ".babyagi_cache.sqlite")
+EMBEDDING_MODEL = os.getenv("BABYAGI_EMBEDDING_MODEL", "text-embedding-3-small")
+SIMILARITY_THRESHOLD = 0.97
+
+# Cache notices go through the agent's logger, which main.py sends to stdout
+log = logging.getLogger("babyagi")
+
+_connection = None
+_lock = threading.Lock()
+# Flipped off after the first embedding failure (e.g. no OpenAI key) so misses don't pay for it every iteration
+_embeddings_available = True
+
+def _get_connection():
+    global _connection
+    if _connection is None:
+        _connection = sqlite3.connect(CACHE_PATH, check_same_thread=False)
+        _connection.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "id INTEGER PRIMARY KEY, scope TEXT NOT NULL, embedding TEXT NOT NULL, response TEXT NOT NULL)"
+        )
+        _connection.execute("CREATE INDEX IF NOT EXISTS responses_scope ON responses (scope)")
+    return _connection
+
+def _message_field(message, field):
+    if isinstance(message, dict):
+        return message.get(field)
+    return getattr(message, field, None)
+
+def _message_text(message):
+    content = _message_field(message, "content")
+    if isinstance(content, list):
+        return "".join(part.get("text", "") for part in content if isinstance(part, dict))
+    return content or ""
+
+def _tool_names(tools):
+    return json.dumps(sorted(tool["function"]["name"] for tool in tools))
+
+def _tool_call_fields(tool_call):
+    function = _message_field(tool_call, "function")
+    return [_message_field(function, "name"), _message_field(function, "arguments")]
+
+def _history(messages):
+    # Tool call ids are fresh on every run and replay, so leave them out to keep equal histories equal
+    return [
+        [_message_field(m, "role"), _message_text(m),
+         [_tool_call_fields(tc) for tc in _message_field(m, "tool_calls") or []]]
+        for m in messages
+    ]
+
+def _scope(messages, tools, model, tools_key=None):
+    return hashlib.sha256(
+        json.dumps([model, tools_key or _tool_names(tools), _history(messages[:-1])], default=str).encode()
+    ).hexdigest()
+
+def _embedding_failed(e):
+    global _embeddings_available
+    log.warning("Semantic cache disabled, embedding failed: %s", e)
+    _embeddings_available = False
+
+def _embed(text):
+    if not _embeddings_available:
+        return None
+    try:
+        response = embedding(model=EMBEDDING_MODEL, input=[text])
+        return response.data[0]["embedding"]
+    except Exception as e:
+        _embedding_failed(e)
+        return None
+
+async def _aembed(text):
+    if not _embeddings_available:
+        return None
+    try:
+        response = await aembedding(model=EMBEDDING_MODEL, input=[text])
+        return response.data[0]["embedding"]
+    except Exception as e:
+        _embedding_failed(e)
+        return None
+
+def _cosine_similarity(a, b):
+    dot = sum(x * y for x, y in zip(a, b))
+    norm = math.sqrt(sum(x * x for x in a)) * math.sqrt(sum(y * y for y in b))
+    return dot / norm if norm else 0.0
+
+def _lookup(scope, vector):
+    with _lock:
+        rows = _get_connection().execute(
+            "SELECT embedding, response FROM responses WHERE scope = ?", (scope,)
+        ).fetchall()
+    best_score, best_response = 0.0, None
+    for stored_embedding, stored_response in rows:
+        score = _cosine_similarity(vector, json.loads(stored_embedding))
+        if score > best_score:
+            best_score, best_response = score, stored_response
+    if best_score > SIMILARITY_THRESHOLD:
+        return json.loads(best_response)
+    return None
+
+def _store(scope, vector, response):
+    with _lock:
+        connection = _get_connection()
+        connection.execute(
+            "INSERT INTO responses (scope, embedding, response) VALUES (?, ?, ?)",
+            (scope, json.dumps(vector), json.dumps(response.model_dump(), default=str))
+        )
+        connection.commit()
+
+def _replay(response_dict):
+    # Tool call ids must stay unique within a conversation, so hand out fresh ones on every hit
+    for choice in response_dict.get("choices", []):
+        for tool_call in (choice.get("message") or {}).get("tool_calls") or []:
+            tool_call["id"] = f"call_{secrets.token_hex(12)}"
+    return ModelResponse(**response_dict)
+
+def cached_completion(messages, tools, model, complete=completion, tools_key=None, **kwargs):
+    """
+    Drop-in wrapper for litellm.completion that serves semantically similar
+    requests from the local cache and writes misses through to it. `complete`
+    performs the live call on a miss and must return a ModelResponse.
+    `tools_key` is an optional precomputed fingerprint of the full tool schemas.
+    """
+    if not CACHE_ENABLED:
+        return complete(model=model, messages=messages, tools=tools, **kwargs)
+
+    scope = _scope(messages, tools, model, tools_key)
+    vector = _embed(_message_text(messages[-1]) + _tool_names(tools))
+    if vector is not None:
+        cached = _lookup(scope, vector)
+        if cached is not None:
+            return _replay(cached)
+
+    response = complete(model=model, messages=messages, tools=tools, **kwargs)
+    if vector is not None:
+        _store(scope, vector, response)
+    return response
+
+async def acached_completion(messages, tools, model, complete=acompletion, tools_key=None, **kwargs):
+    """
+    Async counterpart of cached_completion; `complete` must be a coroutine function.
+    """
+    if not CACHE_ENABLED:
+        return await complete(model=model, messages=messages, tools=tools, **kwargs)
+
+    scope = _scope(messages, tools, model, tools_key)
+    vector = await _aembed(_message_text(messages[-1]) + _tool_names(tools))
+    if vector is not None:
+        cached = _lookup(scope, vector)
+        if cached is not None:
+            return _replay(cached)
+
+    response = await complete(model=model, messages=messages, tools=tools, **kwargs)
+    if vector is not None:
+        _store(scope, vector, response)
+    return response
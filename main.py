@@ -1,10 +1,21 @@
-import os, json, traceback, subprocess, sys
-from time import sleep
-from litellm import completion
+import io, os, re, json, site, random, hashlib, logging, reprlib, threading, traceback, subprocess, sys
+import asyncio
+import importlib
+import importlib.util
+from email.utils import parsedate_to_datetime
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+import httpx
+import litellm
+import orjson
+from litellm import acompletion, stream_chunk_builder
+from litellm_cache import acached_completion
 from dotenv import load_dotenv
 
-import sys
-sys.stdout.reconfigure(line_buffering=True)
+# Line buffering only helps someone watching a terminal; redirected output stays block buffered
+IS_TTY = sys.stdout.isatty()
+sys.stdout.reconfigure(line_buffering=IS_TTY)
 
 load_dotenv()
 
@@ -16,20 +27,95 @@ class Colors:
     HEADER = '\033[95m'; OKBLUE = '\033[94m'; OKCYAN = '\033[96m'; OKGREEN = '\033[92m'
     WARNING = '\033[93m'; FAIL = '\033[91m'; ENDC = '\033[0m'; BOLD = '\033[1m'; UNDERLINE = '\033[4m'
 
+# No escape codes when output goes to a file or pipe
+if not IS_TTY:
+    for _color in [attr for attr in vars(Colors) if attr.isupper()]:
+        setattr(Colors, _color, "")
+
+# Tool activity goes through logging so messages are only formatted when the level is enabled
+logger = logging.getLogger("babyagi")
+_log_handler = logging.StreamHandler(sys.stdout)
+_log_handler.setFormatter(logging.Formatter("%(message)s"))
+logger.addHandler(_log_handler)
+logger.setLevel(os.getenv("BABYAGI_LOG", "INFO").upper())
+logger.propagate = False
+
 # Configuration
 MODEL_NAME = os.environ.get('LITELLM_MODEL')
-tools, available_functions = [], {}
+_tools_by_name, available_functions = {}, {}
+# Provider-facing tool list, re-rendered only when a tool is registered
+_tools_snapshot, _tools_hash = (), None
+_pending_installs, _install_lock = [], threading.Lock()
 MAX_TOOL_OUTPUT_LENGTH = 5000  # Adjust as needed
+MAX_BACKOFF_SECONDS = 8
+MAX_RATE_LIMIT_RETRIES = 10
+MAX_RATE_LIMIT_WAIT_SECONDS = 60
+MAX_TOOL_WORKERS = 8
+WHEEL_CACHE_DIR = os.path.expanduser("~/.cache/wheels")
+# Tools that exec into this module's globals run on the main thread, before the rest
+MAIN_THREAD_TOOLS = {"create_or_update_tool"}
 
 # Automatically detect available API keys
 api_key_patterns = ['API_KEY', 'ACCESS_TOKEN', 'SECRET_KEY', 'TOKEN', 'APISECRET']
 available_api_keys = [key for key in os.environ.keys() if any(pattern in key.upper() for pattern in api_key_patterns)]
 
+# Static system instructions. Kept free of interpolation so the prompt prefix is
+# byte-identical across runs and machines and can be served from the provider's prompt cache.
+STATIC_INSTRUCTIONS = (
+    "You are an AI assistant designed to iteratively build and execute Python functions using tools provided to you. "
+    "Your task is to complete the requested task by creating and using tools in a loop until the task is fully done. "
+    "Do not ask for user input until you find it absolutely necessary. If you need required information that is likely available online, create the required tools to find this information. "
+    "You have the following tools available to start with:\n\n"
+    "1. **create_or_update_tool**: This tool allows you to create new functions or update existing ones. "
+    "You must provide the function name, code, description, and parameters. "
+    "**All four arguments are required**. The 'parameters' argument should be a dictionary defining the parameters the function accepts, following JSON schema format.\n"
+    "Example of 'parameters': {\n"
+    '  "param1": {"type": "string", "description": "Description of param1."},\n'
+    '  "param2": {"type": "integer", "description": "Description of param2."}\n'
+    "}\n"
+    "2. **install_package**: Installs a Python package using pip. Provide the 'package_name' as the parameter. "
+    "Packages requested in the same step are installed together once all of that step's tool calls have run.\n"
+    "3. **flush_installs**: Installs any queued packages immediately.\n"
+    "4. **task_completed**: This tool should be used to signal when you believe the requested task is fully completed.\n\n"
+    "If you do not know how to use an API, look up the documentation and find examples.\n\n"
+    "Your workflow should include:\n"
+    "- Creating or updating tools with all required arguments.\n"
+    "- Using 'install_package' when a required library is missing.\n"
+    "- Using created tools to progress towards completing the task.\n"
+    "- When creating or updating tools, provide the complete code as it will be used without any edits.\n"
+    "- Handling any errors by adjusting your tools or arguments as necessary.\n"
+    "- **Being token-efficient**: avoid returning excessively long outputs. If a tool returns a large amount of data, consider summarizing it or returning only relevant parts.\n"
+    "- Prioritize using tools that you have access to via the available API keys.\n"
+    "- Signaling task completion with 'task_completed()' when done.\n"
+    "\nPlease ensure that all function calls include all required parameters, and be mindful of token limits when handling tool outputs."
+)
+
+# Prompt caching: Anthropic needs an explicit cache breakpoint, OpenAI routes on a stable cache key
+PROMPT_CACHE_KEY = "babyagi-v1"
+
+def is_anthropic_model(model):
+    return bool(model) and ("claude" in model or model.startswith("anthropic/"))
+
+def is_openai_model(model):
+    return bool(model) and model.startswith(("gpt-", "o1", "o3", "o4", "openai/"))
+
+def build_static_system_message():
+    # Only Anthropic needs content blocks (to carry cache_control); other providers get a plain string,
+    # which every provider accepts for system content
+    if is_anthropic_model(MODEL_NAME):
+        block = {"type": "text", "text": STATIC_INSTRUCTIONS, "cache_control": {"type": "ephemeral"}}
+        return {"role": "system", "content": [block]}
+    return {"role": "system", "content": STATIC_INSTRUCTIONS}
+
+def prompt_cache_kwargs(model):
+    if is_openai_model(model):
+        return {"extra_body": {"prompt_cache_key": PROMPT_CACHE_KEY}}
+    return {}
+
 def register_tool(name, func, description, parameters):
-    global tools
-    tools = [tool for tool in tools if tool["function"]["name"] != name]
+    global _tools_snapshot, _tools_hash
     available_functions[name] = func
-    tools.append({
+    _tools_by_name[name] = {
         "type": "function",
         "function": {
             "name": name,
@@ -40,8 +126,17 @@ def register_tool(name, func, description, parameters):
                 "required": list(parameters.keys())
             }
         }
-    })
-    print(f"{Colors.OKGREEN}{Colors.BOLD}Registered tool:{Colors.ENDC} {name}")
+    }
+    # Keep tool order stable so the tools section of the prompt stays cacheable
+    _tools_snapshot = tuple(_tools_by_name[tool_name] for tool_name in sorted(_tools_by_name))
+    _tools_hash = hashlib.sha256(json.dumps(_tools_snapshot, sort_keys=True).encode()).hexdigest()
+    logger.info("%s%sRegistered tool:%s %s", Colors.OKGREEN, Colors.BOLD, Colors.ENDC, name)
+
+def __getattr__(name):
+    # Keep `main.tools` working for importers now that the registry is a dict
+    if name == "tools":
+        return list(_tools_snapshot)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 def create_or_update_tool(name, code, description, parameters):
     try:
@@ -52,36 +147,205 @@ def create_or_update_tool(name, code, description, parameters):
         return f"Error creating/updating tool '{name}': {e}"
 
 def install_package(package_name):
-    try:
-        subprocess.check_call([sys.executable, "-m", "pip", "install", package_name])
-        return f"Package '{package_name}' installed successfully."
-    except Exception as e:
-        return f"Error installing package '{package_name}': {e}"
+    # Installs are queued and run together by flush_installs, so pip starts and resolves once per step
+    with _install_lock:
+        if package_name not in _pending_installs:
+            _pending_installs.append(package_name)
+    return f"Package '{package_name}' queued for installation."
+
+def flush_installs():
+    with _install_lock:
+        packages = list(_pending_installs)
+        _pending_installs.clear()
+        if not packages:
+            return "No packages pending installation."
+        # One pip process per batch; the lock keeps concurrent flushes from running pip side by side.
+        # pip's in-process entry point isn't a supported API and reconfigures logging, so it stays out of this process
+        command = [sys.executable, "-m", "pip", "install", "--prefer-binary", "--no-input", "--disable-pip-version-check", "-q"]
+        if os.path.isdir(WHEEL_CACHE_DIR):
+            command += ["--find-links", WHEEL_CACHE_DIR]
+        try:
+            exit_code = subprocess.run(command + packages).returncode
+        except Exception as e:
+            return f"Error installing packages {', '.join(packages)}: {e}"
+        if exit_code != 0:
+            return f"Error installing packages {', '.join(packages)}: pip exit {exit_code}"
+        # Make freshly installed packages importable in this process; a user site created by this install
+        # wasn't on sys.path at startup
+        importlib.invalidate_caches()
+        user_site = site.getusersitepackages()
+        if site.ENABLE_USER_SITE and os.path.isdir(user_site) and user_site not in sys.path:
+            site.addsitedir(user_site)
+        return f"Packages installed successfully: {', '.join(packages)}."
 
 def serialize_tool_result(tool_result, max_length=MAX_TOOL_OUTPUT_LENGTH):
+    # JSON escapes each character on its own, so the first max_length characters of a long string's
+    # encoding only depend on its first max_length characters; cut it before encoding.
+    # Other results are encoded whole: orjson can't stop early, but encodes a few MB in milliseconds,
+    # which beats the pure-Python incremental encoder even when that one stops at the limit
+    if isinstance(tool_result, str) and len(tool_result) > max_length:
+        tool_result = tool_result[:max_length]
     try:
-        serialized_result = json.dumps(tool_result)
+        serialized_result = orjson.dumps(tool_result, default=str).decode()
     except TypeError:
-        serialized_result = str(tool_result)
+        # orjson rejects e.g. non-string keys; encode incrementally and stop shortly past the limit
+        try:
+            chunks, total = [], 0
+            for chunk in json.JSONEncoder(default=str).iterencode(tool_result):
+                chunks.append(chunk)
+                total += len(chunk)
+                if total > max_length:
+                    break
+            serialized_result = "".join(chunks)
+        except (TypeError, ValueError):
+            # Every repr'd item takes at least one character, so max_length items per container always fill the budget
+            limited_repr = reprlib.Repr()
+            for limit in ("maxstring", "maxother", "maxlist", "maxtuple", "maxdict", "maxset", "maxfrozenset", "maxdeque", "maxarray"):
+                setattr(limited_repr, limit, max_length)
+            serialized_result = limited_repr.repr(tool_result)
     if len(serialized_result) > max_length:
-        return serialized_result[:max_length] + f"\n\n{Colors.WARNING}(Note: Result was truncated to {max_length} characters out of {len(serialized_result)} total characters.){Colors.ENDC}"
+        return serialized_result[:max_length] + f"\n\n{Colors.WARNING}(Note: Result was truncated to {max_length} characters.){Colors.ENDC}"
     else:
         return serialized_result
 
 def call_tool(function_name, args):
     func = available_functions.get(function_name)
     if not func:
-        print(f"{Colors.FAIL}{Colors.BOLD}Error:{Colors.ENDC} Tool '{function_name}' not found.")
+        logger.error("%s%sError:%s Tool '%s' not found.", Colors.FAIL, Colors.BOLD, Colors.ENDC, function_name)
         return f"Tool '{function_name}' not found."
     try:
-        print(f"{Colors.OKBLUE}{Colors.BOLD}Calling tool:{Colors.ENDC} {function_name} with args: {args}")
+        logger.info("%s%sCalling tool:%s %s with args: %s", Colors.OKBLUE, Colors.BOLD, Colors.ENDC, function_name, args)
         result = func(**args)
-        print(f"{Colors.OKCYAN}{Colors.BOLD}Result of {function_name}:{Colors.ENDC} {result}")
+        logger.info("%s%sResult of %s:%s %s", Colors.OKCYAN, Colors.BOLD, function_name, Colors.ENDC, result)
         return result
     except Exception as e:
-        print(f"{Colors.FAIL}{Colors.BOLD}Error:{Colors.ENDC} Error executing '{function_name}': {e}")
+        logger.error("%s%sError:%s Error executing '%s': %s", Colors.FAIL, Colors.BOLD, Colors.ENDC, function_name, e)
         return f"Error executing '{function_name}': {e}"
 
+def parse_reset_duration(value):
+    # OpenAI reports resets as durations like "1s", "6m0s" or "20ms"
+    parts = re.findall(r"(\d+(?:\.\d+)?)(ms|s|m|h)", value)
+    if not parts:
+        return None
+    scale = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+    return sum(float(amount) * scale[unit] for amount, unit in parts)
+
+def rate_limit_delay(error):
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    retry_after = headers.get("retry-after")
+    wait = None
+    if retry_after:
+        try:
+            wait = float(retry_after)
+        except ValueError:
+            try:
+                wait = (parsedate_to_datetime(retry_after) - datetime.now(timezone.utc)).total_seconds()
+            except (TypeError, ValueError):
+                wait = None
+    if wait is None:
+        for header in ("x-ratelimit-reset-requests", "x-ratelimit-reset-tokens"):
+            if headers.get(header):
+                wait = parse_reset_duration(headers[header])
+                if wait is not None:
+                    break
+    if wait is None:
+        wait = 1.0
+    # A bogus or far-off reset time shouldn't stall the agent; past the cap, retrying is cheap
+    return min(max(wait, 0), MAX_RATE_LIMIT_WAIT_SECONDS) + random.uniform(0, 0.25)
+
+def error_backoff(consecutive_errors):
+    return min(0.25 * 2 ** consecutive_errors, MAX_BACKOFF_SECONDS)
+
+def run_tool_call(tool_call):
+    return call_tool(tool_call.function.name, orjson.loads(tool_call.function.arguments))
+
+async def execute_tool_calls(tool_calls, executor, started=None):
+    """
+    Run the tool calls of one LLM response on executor, returning (tool_call, result) pairs in the original order.
+    Calls already dispatched while the response was streaming are passed in as `started` (id -> Future).
+    """
+    started = started or {}
+    results, pending = [None] * len(tool_calls), {}
+    for index, tool_call in enumerate(tool_calls):
+        if tool_call.id in started:
+            pending[index] = started[tool_call.id]
+        elif tool_call.function.name in MAIN_THREAD_TOOLS:
+            results[index] = run_tool_call(tool_call)
+    for index, tool_call in enumerate(tool_calls):
+        if index not in pending and tool_call.function.name not in MAIN_THREAD_TOOLS:
+            pending[index] = executor.submit(run_tool_call, tool_call)
+    for index, result in zip(pending, await asyncio.gather(*map(asyncio.wrap_future, pending.values()))):
+        results[index] = result
+    return list(zip(tool_calls, results))
+
+def early_tool_dispatcher(started, executor):
+    """
+    Build an on_tool_call callback for stream_completion that starts tools while the LLM is still generating.
+    """
+    deferred = False
+    def dispatch(tool_call_id, name, args):
+        nonlocal deferred
+        # Calls after a main-thread tool may depend on it, so leave them for execute_tool_calls;
+        # once task_completed shows up nothing else needs to start
+        if deferred or name in MAIN_THREAD_TOOLS or name == "task_completed":
+            deferred = True
+            return
+        started[tool_call_id] = executor.submit(call_tool, name, args)
+    return dispatch
+
+async def cancel_started(started):
+    """
+    Drop tool calls dispatched early for a response that won't be used: cancel those still queued
+    and wait for those already running, so a retry can't run them concurrently a second time.
+    """
+    # Keep the executor futures rather than asyncio tasks: cancelling a task wrapping a running thread
+    # returns at once while the thread carries on, so only the executor future can be waited on
+    for future in started.values():
+        future.cancel()
+    running = [asyncio.wrap_future(future) for future in started.values() if not future.cancelled()]
+    if running:
+        await asyncio.wait(running)
+    started.clear()
+
+async def stream_completion(model, messages, tools, on_content=None, on_tool_call=None, **kwargs):
+    """
+    Stream a completion, reporting content deltas and each tool call as soon as its arguments are complete.
+    Returns the assembled ModelResponse.
+    """
+    chunks, pending = [], {}
+    async for chunk in await acompletion(model=model, messages=messages, tools=tools, stream=True, **kwargs):
+        chunks.append(chunk)
+        if not chunk.choices:
+            continue
+        delta = chunk.choices[0].delta
+        if delta.content and on_content:
+            on_content(delta.content)
+        for tool_call_delta in delta.tool_calls or []:
+            call = pending.setdefault(tool_call_delta.index, {"id": None, "name": None, "arguments": "", "dispatched": False})
+            call["id"] = call["id"] or tool_call_delta.id
+            if tool_call_delta.function:
+                call["name"] = call["name"] or tool_call_delta.function.name
+                call["arguments"] += tool_call_delta.function.arguments or ""
+            if not on_tool_call or call["dispatched"] or not (call["id"] and call["name"]):
+                continue
+            if not call["arguments"].rstrip().endswith("}"):
+                continue
+            try:
+                args = orjson.loads(call["arguments"])
+            except orjson.JSONDecodeError:
+                continue
+            call["dispatched"] = True
+            on_tool_call(call["id"], call["name"], args)
+    return stream_chunk_builder(chunks, messages=messages)
+
+def open_http_session():
+    """
+    Share one async HTTP client across all iterations so connections (and HTTP/2 streams) are reused.
+    """
+    http2 = importlib.util.find_spec("h2") is not None
+    litellm.aclient_session = httpx.AsyncClient(http2=http2)
+    return litellm.aclient_session
+
 def task_completed():
     return "Task marked as completed."
 
@@ -104,21 +368,41 @@ register_tool("create_or_update_tool", create_or_update_tool, "Creates or update
     }
 })
 
-register_tool("install_package", install_package, "Installs a Python package using pip.", {
+register_tool("install_package", install_package, "Installs a Python package using pip. Packages are installed together at the end of the current step.", {
     "package_name": {"type": "string", "description": "The name of the package to install."}
 })
 
+register_tool("flush_installs", flush_installs, "Installs all queued packages in a single pip invocation.", {})
+
 register_tool("task_completed", task_completed, "Marks the current task as completed.", {})
 
+class Tee(io.TextIOBase):
+    """
+    Write-only text stream that forwards every write to each of its sinks.
+    """
+    def __init__(self, *sinks):
+        self.sinks = sinks
+
+    def writable(self):
+        return True
+
+    def write(self, s):
+        for sink in self.sinks:
+            sink.write(s)
+        return len(s)
+
+    def flush(self):
+        for sink in self.sinks:
+            sink.flush()
+
 # Main loop to handle user input and LLM interaction
-def run_main_loop(user_input):
-    # Create a list to store all output
-    output_buffer = []
+async def run_main_loop_async(user_input):
+    # Everything logged goes through one write path to both stdout and the captured output
+    output_buffer = io.StringIO()
+    tee = Tee(sys.stdout, output_buffer)
 
-    # Function to write to both buffer and print
     def log(message):
-        output_buffer.append(message)
-        print(message)
+        print(message, file=tee)
 
     # Include available API keys in the system prompt
     if available_api_keys:
@@ -126,77 +410,99 @@ def run_main_loop(user_input):
     else:
         api_keys_info = "No API keys are available.\n\n"
 
-    messages = [{
-        "role": "system",
-        "content": (
-            "You are an AI assistant designed to iteratively build and execute Python functions using tools provided to you. "
-            "Your task is to complete the requested task by creating and using tools in a loop until the task is fully done. "
-            "Do not ask for user input until you find it absolutely necessary. If you need required information that is likely available online, create the required tools to find this information. "
-            "You have the following tools available to start with:\n\n"
-            "1. **create_or_update_tool**: This tool allows you to create new functions or update existing ones. "
-            "You must provide the function name, code, description, and parameters. "
-            "**All four arguments are required**. The 'parameters' argument should be a dictionary defining the parameters the function accepts, following JSON schema format.\n"
-            "Example of 'parameters': {\n"
-            '  "param1": {"type": "string", "description": "Description of param1."},\n'
-            '  "param2": {"type": "integer", "description": "Description of param2."}\n'
-            "}\n"
-            "2. **install_package**: Installs a Python package using pip. Provide the 'package_name' as the parameter.\n"
-            "3. **task_completed**: This tool should be used to signal when you believe the requested task is fully completed.\n\n"
-            f"Here are API keys you have access to: {api_keys_info}"
-            "If you do not know how to use an API, look up the documentation and find examples.\n\n"
-            "Your workflow should include:\n"
-            "- Creating or updating tools with all required arguments.\n"
-            "- Using 'install_package' when a required library is missing.\n"
-            "- Using created tools to progress towards completing the task.\n"
-            "- When creating or updating tools, provide the complete code as it will be used without any edits.\n"
-            "- Handling any errors by adjusting your tools or arguments as necessary.\n"
-            "- **Being token-efficient**: avoid returning excessively long outputs. If a tool returns a large amount of data, consider summarizing it or returning only relevant parts.\n"
-            "- Prioritize using tools that you have access to via the available API keys.\n"
-            "- Signaling task completion with 'task_completed()' when done.\n"
-            "\nPlease ensure that all function calls include all required parameters, and be mindful of token limits when handling tool outputs."
-        )
-    }, {"role": "user", "content": user_input}]
+    messages = [
+        build_static_system_message(),
+        {"role": "system", "content": f"Here are API keys you have access to: {api_keys_info}"},
+        {"role": "user", "content": user_input}
+    ]
     iteration, max_iterations = 0, 50
-    while iteration < max_iterations:
-        log(f"{Colors.HEADER}{Colors.BOLD}Iteration {iteration + 1} running...{Colors.ENDC}")
-        try:
-            response = completion(model=MODEL_NAME, messages=messages, tools=tools, tool_choice="auto")
-            response_message = response.choices[0].message
-            if response_message.content:
-                log(f"{Colors.OKCYAN}{Colors.BOLD}LLM Response:{Colors.ENDC}\n{response_message.content}\n")
-            messages.append(response_message)
-            if response_message.tool_calls:
-                for tool_call in response_message.tool_calls:
-                    function_name = tool_call.function.name
-                    args = json.loads(tool_call.function.arguments)
-                    tool_result = call_tool(function_name, args)
-                    serialized_tool_result = serialize_tool_result(tool_result)
-                    messages.append({
-                        "role": "tool",
-                        "name": function_name,
-                        "tool_call_id": tool_call.id,
-                        "content": serialized_tool_result
-                    })
-                if 'task_completed' in [tc.function.name for tc in response_message.tool_calls]:
-                    log(f"{Colors.OKGREEN}{Colors.BOLD}Task completed.{Colors.ENDC}")
-                    break
-        except Exception as e:
-            log(f"{Colors.FAIL}{Colors.BOLD}Error:{Colors.ENDC} Error in main loop: {e}")
-            traceback.print_exc()
-        iteration += 1
-        sleep(2)
+    consecutive_errors, rate_limit_retries = 0, 0
+    # Tool calls are submitted to this pool directly so cancel_started can wait on their threads;
+    # it is local to the run, so repeated runs in one event loop don't leave pools behind
+    executor = ThreadPoolExecutor(max_workers=MAX_TOOL_WORKERS)
+    previous_session = litellm.aclient_session
+    http_session = open_http_session()
+    try:
+        while iteration < max_iterations:
+            log(f"{Colors.HEADER}{Colors.BOLD}Iteration {iteration + 1} running...{Colors.ENDC}")
+            streamed, started = [], {}
+            try:
+                def on_content(text):
+                    if not streamed:
+                        log(f"{Colors.OKCYAN}{Colors.BOLD}LLM Response:{Colors.ENDC}")
+                    streamed.append(text)
+                    print(text, end="", file=tee, flush=True)
+                complete = partial(stream_completion, on_content=on_content, on_tool_call=early_tool_dispatcher(started, executor))
+                response = await acached_completion(messages, list(_tools_snapshot), MODEL_NAME, complete=complete, tools_key=_tools_hash, tool_choice="auto", **prompt_cache_kwargs(MODEL_NAME))
+                response_message = response.choices[0].message
+                if response_message.content:
+                    if streamed:
+                        log("\n")
+                    else:
+                        log(f"{Colors.OKCYAN}{Colors.BOLD}LLM Response:{Colors.ENDC}\n{response_message.content}\n")
+                messages.append(response_message)
+                if response_message.tool_calls:
+                    names = [tc.function.name for tc in response_message.tool_calls]
+                    if "task_completed" in names:
+                        # The task is done, so skip the sibling calls and drop any that already started
+                        await cancel_started(started)
+                        tool_call = response_message.tool_calls[names.index("task_completed")]
+                        results = [(tool_call, run_tool_call(tool_call))]
+                    else:
+                        results = await execute_tool_calls(response_message.tool_calls, executor, started)
+                        if _pending_installs:
+                            install_result = await asyncio.get_running_loop().run_in_executor(executor, flush_installs)
+                            results = [(tc, install_result if tc.function.name == "install_package" else result) for tc, result in results]
+                    for tool_call, tool_result in results:
+                        serialized_tool_result = serialize_tool_result(tool_result)
+                        messages.append({
+                            "role": "tool",
+                            "name": tool_call.function.name,
+                            "tool_call_id": tool_call.id,
+                            "content": serialized_tool_result
+                        })
+                    if "task_completed" in names:
+                        log(f"{Colors.OKGREEN}{Colors.BOLD}Task completed.{Colors.ENDC}")
+                        break
+                consecutive_errors, rate_limit_retries = 0, 0
+            except litellm.RateLimitError as e:
+                # The response these calls belonged to is discarded, so the model would never see their results
+                await cancel_started(started)
+                # Wait only as long as the provider asks, and don't burn an iteration on it
+                rate_limit_retries += 1
+                wait = rate_limit_delay(e)
+                log(f"{Colors.WARNING}{Colors.BOLD}Rate limited:{Colors.ENDC} retrying in {wait:.2f}s")
+                await asyncio.sleep(wait)
+                if rate_limit_retries <= MAX_RATE_LIMIT_RETRIES:
+                    continue
+            except Exception as e:
+                log(f"{Colors.FAIL}{Colors.BOLD}Error:{Colors.ENDC} Error in main loop: {e}")
+                traceback.print_exc()
+                await cancel_started(started)
+                await asyncio.sleep(error_backoff(consecutive_errors))
+                consecutive_errors += 1
+            iteration += 1
+    finally:
+        await http_session.aclose()
+        litellm.aclient_session = previous_session
+        # Normally every tool call has finished by now; after an error, don't block the loop on stragglers
+        executor.shutdown(wait=False, cancel_futures=True)
     log(f"{Colors.WARNING}{Colors.BOLD}Max iterations reached or task completed.{Colors.ENDC}")
 
     # Write all output to a file
     # At the end of the function, write to a file
+    output = output_buffer.getvalue()
     try:
         with open('output.txt', 'w', encoding='utf-8') as f:
-            f.write("\n".join(output_buffer))
+            f.write(output)
     except Exception as e:
         print(f"Error writing to output file: {e}")
 
     # Return the buffer content directly
-    return "\n".join(output_buffer)
+    return output
+
+def run_main_loop(user_input):
+    return asyncio.run(run_main_loop_async(user_input))
 
 if __name__ == "__main__":
     try:
@@ -1,302 +1,646 @@
+import io
 import os
+import re
 import sys
 import json
-import traceback
-from time import sleep
+import mmap
+import asyncio
+import subprocess
+import time
+import random
+import secrets
+import functools
+import shlex
+import hashlib
+import tarfile
+import shutil
+import logging
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+from types import MappingProxyType
+import requests
+from requests.adapters import HTTPAdapter
 from daytona_sdk import Daytona, CreateWorkspaceParams, DaytonaConfig
+try:
+    from daytona_sdk import SessionExecuteRequest
+except ImportError:  # SDK releases without process sessions can only run blocking exec
+    SessionExecuteRequest = None
 from dotenv import load_dotenv
 
 # Load environment variables from the user's environment
 load_dotenv()
 
-def comprehensive_error_logging(error: Exception, context: str = ""):
+logging.basicConfig(level=os.getenv("BABYAGI_LOG", "INFO").upper(), format="%(message)s", stream=sys.stdout)
+log = logging.getLogger("babyagi.sandbox")
+
+# Upper bound for a single BabyAGI run inside the workspace
+RUN_TIMEOUT_SECONDS = 600
+
+# Local files uploaded into every workspace
+CURRENT_DIR = Path(__file__).resolve().parent
+FILES_TO_COPY = ("main.py", "requirements.txt", "get-pip.py")
+
+# Upstream repository, cloned only when the full checkout is requested with --full-repo
+REPO_URL = "https://github.com/nkkko/babyagi-2o.git"
+
+# Error message fragments that mark a failure as worth retrying
+TRANSIENT_MARKERS = ("rate limit", "too many requests", "timed out", "timeout", "temporarily", "connection reset", "connection aborted", "connection refused")
+
+# Content-addressed cache of prepared upload bundles
+BUNDLE_CACHE_DIR = Path("~/.cache/babyagi-2o").expanduser()
+
+# Shared pool for workspace uploads; each upload is an independent HTTP round-trip
+_UPLOAD_POOL = ThreadPoolExecutor(max_workers=4)
+
+def _read_payload(path):
     """
-    Provide comprehensive error logging with detailed information.
+    Read a file for upload by mapping it and letting the kernel page it in, rather than going through read()'s buffer.
     """
-    print(f"\n❌ Error in {context}:")
-    print(f"Type: {type(error)}")
-    print(f"Details: {str(error)}")
-    print("Detailed Traceback:")
-    traceback.print_exc()
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return b""
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            return bytes(mm)
+
+# Host-side wheelhouse for requirements.txt, mirrored into the workspace under the same name
+WHEELHOUSE_NAME = ".wheelcache"
+
+# Interpreter and platform of the workspace image; wheels are fetched for these rather than for the host
+WORKSPACE_PYTHON_VERSION = "3.11"
+WORKSPACE_PLATFORMS = ("manylinux2014_x86_64", "manylinux_2_17_x86_64", "linux_x86_64")
+
+# Cached wheelhouses are refreshed after this long so unpinned requirements pick up new releases
+WHEELHOUSE_MAX_AGE_SECONDS = 24 * 60 * 60
 
-def clone_repository_with_fallbacks(workspace):
+# Connections kept open per host on the Daytona client's HTTP session
+HTTP_POOL_SIZE = 16
+
+# Environment variables read once per process by _env_snapshot
+ENV_KEYS = ("DAYTONA_API_KEY", "DAYTONA_SERVER_URL", "DAYTONA_TARGET", "LITELLM_MODEL", "OPENAI_API_KEY", "ANTHROPIC_API_KEY", "DAYTONA_WORKSPACE_ID")
+
+# Environment variables that must be set before any workspace work starts
+REQUIRED_ENV_KEYS = ("DAYTONA_API_KEY",)
+
+# Model provider keys forwarded into the workspace .env when set
+FORWARDED_ENV_KEYS = ("OPENAI_API_KEY", "ANTHROPIC_API_KEY")
+
+@functools.lru_cache(maxsize=1)
+def _env_snapshot():
     """
-    Clone repository by uploading necessary files directly.
+    Return a read-only snapshot of the variables this module uses, taken once after main() has loaded .env.
     """
-    try:
-        workspace_dir = "/tmp/babyagi/workspace"
-        print(f"🔄 Setting up workspace in {workspace_dir}")
+    return MappingProxyType({key: os.getenv(key, "") for key in ENV_KEYS})
 
-        # Clean up any existing directory
-        workspace.process.exec(f"rm -rf {workspace_dir}")
+@functools.lru_cache(maxsize=1)
+def _daytona_config():
+    """
+    Build the Daytona configuration once from the environment snapshot.
+    """
+    env = _env_snapshot()
+    return DaytonaConfig(
+        api_key=env["DAYTONA_API_KEY"] or None,
+        server_url=env["DAYTONA_SERVER_URL"] or None,
+        target=env["DAYTONA_TARGET"] or "local"
+    )
+
+def _tune_http_pool(daytona_client):
+    """
+    Reuse keep-alive connections across Daytona RPCs by widening the client's requests pool, when it has one.
+    """
+    session = getattr(daytona_client, "_session", None)
+    if not isinstance(session, requests.Session):
+        log.debug("Daytona client has no requests session, leaving its HTTP pool as is")
+        return
+    adapter = HTTPAdapter(pool_connections=HTTP_POOL_SIZE, pool_maxsize=HTTP_POOL_SIZE, max_retries=0)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers["Connection"] = "keep-alive"
 
-        # Create workspace directory
-        workspace.process.exec(f"mkdir -p {workspace_dir}")
+def comprehensive_error_logging(error: Exception, context: str = ""):
+    """
+    Provide comprehensive error logging with detailed information.
+    """
+    log.exception("\n❌ Error in %s:\nType: %s\nDetails: %s\nDetailed Traceback:", context, type(error), error)
 
-        # Files to upload
-        current_dir = os.path.dirname(os.path.abspath(__file__))
-        files_to_copy = ['main.py', 'requirements.txt', 'get-pip.py']
+class RemoteCommandError(RuntimeError):
+    """
+    A remote command ran but exited non-zero. It is never transient: the exit code says the command itself failed,
+    and its output is kept in `output` so version strings or log lines in it can't be mistaken for network errors.
+    """
+    transient = False
 
-        for file in files_to_copy:
-            try:
-                file_path = os.path.join(current_dir, file)
-                with open(file_path, 'rb') as f:
-                    content = f.read()
-                workspace.fs.upload_file(f"{workspace_dir}/{file}", content)
-                print(f"✅ Uploaded {file} to {workspace_dir}/{file}")
-
-                # Verify file exists by listing
-                ls_result = workspace.process.exec(f"ls -la {workspace_dir}/{file}")
-                if ls_result and ls_result.result:
-                    print(f"📄 {file} exists and is {len(content)} bytes")
-                else:
-                    raise RuntimeError(f"{file} not found after upload")
-            except Exception as e:
-                print(f"⚠️ Error uploading {file}: {e}")
+    def __init__(self, message, code=None, output=""):
+        super().__init__(message)
+        self.code = code
+        self.output = output
+
+def _is_transient(error: Exception) -> bool:
+    """
+    Tell rate limits, server errors and network hiccups apart from fatal errors.
+    """
+    transient = getattr(error, "transient", None)
+    if transient is not None:
+        return transient
+    status = getattr(error, "status_code", None) or getattr(getattr(error, "response", None), "status_code", None)
+    if isinstance(status, int):
+        return status == 429 or status >= 500
+    message = str(error).lower()
+    return bool(re.search(r"(?<![\w.])(429|50[0234])(?![\w.])", message)) or any(marker in message for marker in TRANSIENT_MARKERS)
+
+def _retry(fn, attempts=3, base=0.5):
+    """
+    Call fn, retrying transient failures with exponential backoff and jitter.
+    """
+    for attempt in range(attempts):
+        try:
+            return fn()
+        except Exception as e:
+            if attempt == attempts - 1 or not _is_transient(e):
                 raise
+            delay = base * 2 ** attempt * (0.5 + random.random())
+            log.warning("⚠️ Transient error (%s), retrying in %.1fs", e, delay)
+            time.sleep(delay)
 
-        print(f"✅ Successfully set up workspace at {workspace_dir}")
-        return workspace_dir
+def _exec_script(workspace, script, cwd=None, timeout=None):
+    """
+    Run a multi-step shell script in a single remote exec round-trip.
+    """
+    return workspace.process.exec(shlex.join(["bash", "-lc", script]), cwd=cwd, timeout=timeout)
 
-    except Exception as setup_error:
-        print(f"❌ Workspace setup failed: {setup_error}")
-        traceback.print_exc()
-        raise RuntimeError(f"Could not set up workspace: {str(setup_error)}")
+def _supports_session_streaming(process):
+    """
+    Tell whether the installed Daytona SDK can run a command in a session and stream its logs.
+    """
+    return SessionExecuteRequest is not None and all(
+        hasattr(process, name) for name in (
+            "create_session", "execute_session_command", "get_session_command_logs_async",
+            "get_session_command", "delete_session"
+        )
+    )
 
-def install_pip(workspace, workspace_dir):
+def _stream_script(workspace, script, on_output, cwd=None, timeout=None, reconnects=3):
     """
-    Install pip using get-pip.py.
+    Run a shell script once in a Daytona session and pass its output to on_output as it arrives.
+    A dropped log stream is reconnected instead of starting the script again. Returns the exit code.
     """
+    process = workspace.process
+    if cwd:
+        script = f"cd {shlex.quote(cwd)} && {script}"
+    deadline = time.monotonic() + timeout if timeout else None
+    session_id = f"babyagi-run-{secrets.token_hex(4)}"
+    _retry(lambda: process.create_session(session_id))
     try:
-        print("\n🛠 Installing pip...")
-        get_pip_path = f"{workspace_dir}/get-pip.py"
-        install_pip_cmd = f"python3 {get_pip_path}"
-        result = workspace.process.exec(install_pip_cmd)
-        if result and result.result:
-            print(f"📦 pip installation output:\n{result.result}")
-        else:
-            raise RuntimeError("pip installation failed without output")
-        return True
-    except Exception as e:
-        print(f"❌ pip installation failed: {e}")
-        traceback.print_exc()
-        return False
+        # Not retried: if the request reached the workspace, a second attempt would run the script twice
+        command = process.execute_session_command(
+            session_id, SessionExecuteRequest(command=shlex.join(["bash", "-lc", script]), var_async=True)
+        )
 
-def setup_virtualenv(workspace, workspace_dir):
+        seen = 0
+        for attempt in range(reconnects + 1):
+            replayed = 0
+            def forward(chunk):
+                nonlocal seen, replayed
+                # Each connection replays the command's logs from the start; only pass on what's new
+                new = chunk[max(0, seen - replayed):]
+                replayed += len(chunk)
+                if new:
+                    seen += len(new)
+                    on_output(new)
+            remaining = None if deadline is None else max(deadline - time.monotonic(), 0)
+            try:
+                asyncio.run(asyncio.wait_for(
+                    process.get_session_command_logs_async(session_id, command.cmd_id, forward), remaining
+                ))
+                break
+            except TimeoutError:
+                raise
+            except Exception as e:
+                if attempt == reconnects or not _is_transient(e):
+                    raise
+                log.warning("⚠️ Log stream dropped (%s), reconnecting", e)
+                time.sleep(0.5 * 2 ** attempt)
+
+        # The stream can close just before the exit code is recorded, so poll briefly for it
+        while (code := _retry(lambda: process.get_session_command(session_id, command.cmd_id)).exit_code) is None:
+            if deadline is not None and time.monotonic() > deadline:
+                raise TimeoutError(f"Command in session {session_id} did not finish within {timeout}s")
+            time.sleep(0.5)
+        return code
+    finally:
+        try:
+            process.delete_session(session_id)
+        except Exception as e:
+            log.debug("Could not delete session %s: %s", session_id, e)
+
+def _build_bundle():
     """
-    Set up a Python virtual environment.
+    Pack FILES_TO_COPY into a gzipped tarball, cached locally by the SHA-256 of its contents.
+    Returns the tarball bytes and the digest.
     """
+    sources = list(zip(FILES_TO_COPY, _UPLOAD_POOL.map(_read_payload, (CURRENT_DIR / name for name in FILES_TO_COPY))))
+    sha256 = hashlib.sha256()
+    for name, content in sources:
+        sha256.update(f"{name}\0{len(content)}\0".encode())
+        sha256.update(content)
+    digest = sha256.hexdigest()
+
+    cached_bundle = BUNDLE_CACHE_DIR / f"{digest}.tgz"
+    if cached_bundle.exists():
+        return cached_bundle.read_bytes(), digest
+
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode="w:gz") as tar:
+        for name, content in sources:
+            info = tarfile.TarInfo(name)
+            info.size = len(content)
+            info.mode = 0o644
+            tar.addfile(info, io.BytesIO(content))
+    data = buffer.getvalue()
     try:
-        print("\n🛠 Setting up virtual environment...")
-        venv_path = f"{workspace_dir}/venv"
-        create_venv_cmd = f"python3 -m venv {venv_path}"
-        result = workspace.process.exec(create_venv_cmd)
-        if result and result.result:
-            print(f"📦 Virtual environment setup output:\n{result.result}")
-
-        # Upgrade pip in the virtual environment
-        upgrade_pip_cmd = f"{venv_path}/bin/pip install --upgrade pip"
-        result = workspace.process.exec(upgrade_pip_cmd)
-        if result and result.result:
-            print(f"📦 pip upgrade output:\n{result.result}")
-
-        return venv_path
-    except Exception as e:
-        print(f"❌ Virtual environment setup failed: {e}")
-        traceback.print_exc()
-        return None
+        BUNDLE_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        cached_bundle.write_bytes(data)
+    except OSError as e:
+        log.warning("⚠️ Could not cache bundle at %s: %s", cached_bundle, e)
+    return data, digest
 
-def install_dependencies(workspace, venv_path, workspace_dir):
+def _ensure_wheelhouse():
     """
-    Install dependencies from requirements.txt within the virtual environment.
+    Download wheels for requirements.txt built for the workspace's Python and platform, and pack them.
+    Cached by requirements.txt and the target, and refreshed after WHEELHOUSE_MAX_AGE_SECONDS.
+    Returns the tarball bytes and the digest, or (None, None) if the wheels can't be fetched.
     """
+    requirements_path = CURRENT_DIR / "requirements.txt"
+    sha256 = hashlib.sha256(requirements_path.read_bytes())
+    sha256.update(f"\0{WORKSPACE_PYTHON_VERSION}\0{','.join(WORKSPACE_PLATFORMS)}".encode())
+    digest = sha256.hexdigest()
+    cached_wheels = BUNDLE_CACHE_DIR / f"wheels-{digest}.tgz"
+    if cached_wheels.exists() and time.time() - cached_wheels.stat().st_mtime < WHEELHOUSE_MAX_AGE_SECONDS:
+        return cached_wheels.read_bytes(), digest
+
+    # Start from an empty directory so wheels left over from earlier requirements aren't packed again
+    wheelhouse = CURRENT_DIR / WHEELHOUSE_NAME
+    shutil.rmtree(wheelhouse, ignore_errors=True)
+    log.info("\n🛞 Downloading wheelhouse for requirements.txt...")
+    platforms = [arg for platform in WORKSPACE_PLATFORMS for arg in ("--platform", platform)]
     try:
-        print("\n📦 Installing dependencies...")
-        install_reqs_cmd = f"{venv_path}/bin/pip install -r {workspace_dir}/requirements.txt"
-        result = workspace.process.exec(install_reqs_cmd)
-        if result and result.result:
-            print(f"📦 Dependencies installation output:\n{result.result}")
-        else:
-            raise RuntimeError("Dependencies installation failed without output")
+        subprocess.run(
+            [sys.executable, "-m", "pip", "download", "-q", "--only-binary=:all:", *platforms,
+             "--python-version", WORKSPACE_PYTHON_VERSION, "--implementation", "cp",
+             "-r", str(requirements_path), "-d", str(wheelhouse)],
+            check=True
+        )
+    except (OSError, subprocess.CalledProcessError) as e:
+        log.warning("⚠️ Could not download wheelhouse, installing from PyPI instead: %s", e)
+        return None, None
+
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode="w:gz") as tar:
+        tar.add(wheelhouse, arcname=WHEELHOUSE_NAME)
+    data = buffer.getvalue()
+    try:
+        BUNDLE_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        cached_wheels.write_bytes(data)
+    except OSError as e:
+        log.warning("⚠️ Could not cache wheelhouse at %s: %s", cached_wheels, e)
+    return data, digest
 
-        # Install additional packages if needed
+def _env_file(workspace_dir, user_input):
+    """
+    Render the workspace .env. It carries API keys, so it is never part of the cached bundle.
+    """
+    env = _env_snapshot()
+    pairs = (
+        ("OBJECTIVE", user_input or "Solve a complex problem"),
+        ("LITELLM_MODEL", env["LITELLM_MODEL"] or "gpt-4o-mini"),
+        *((key, value) for key in FORWARDED_ENV_KEYS if (value := env[key])),
+        ("PYTHONUNBUFFERED", "1"),
+        ("PYTHONPATH", f"{workspace_dir}/venv/lib/python{WORKSPACE_PYTHON_VERSION}/site-packages"),
+        ("PATH", f"{workspace_dir}/venv/bin:$PATH")
+    )
+    return "\n".join(f"{key}={value}" for key, value in pairs).encode()
+
+def provision_workspace(workspace, user_input, full_repo=False):
+    """
+    Upload the bundle, wheelhouse and .env in one parallel phase, then unpack them, install pip,
+    create the virtual environment and install dependencies in a single remote script.
+    With full_repo the upstream repository is git-cloned first and the bundle is unpacked over it.
+    Returns the workspace directory and the virtual environment path.
+    """
+    env_path = None
+    try:
+        workspace_dir = "/tmp/babyagi/workspace"
+        venv_path = f"{workspace_dir}/venv"
+        log.info("🔄 Setting up workspace in %s", workspace_dir)
+
+        # Payloads go to /tmp as files: inlining them as base64 into the exec command would overflow
+        # the remote argument limit once the wheelhouse is included
+        bundle, digest = _build_bundle()
+        wheels, wheels_digest = _ensure_wheelhouse()
+        bundle_path = f"/tmp/babyagi-{digest[:12]}.tgz"
+        wheels_path = f"/tmp/babyagi-wheels-{wheels_digest[:12]}.tgz" if wheels else None
+        env_path, env_content = f"/tmp/babyagi-env-{secrets.token_hex(4)}", _env_file(workspace_dir, user_input)
+        uploads = [(bundle_path, bundle), (env_path, env_content)]
+        if wheels:
+            uploads.append((wheels_path, wheels))
+
+        # Everything is uploaded outside workspace_dir, so the uploads overlap with the optional clone
+        pending = [_UPLOAD_POOL.submit(workspace.fs.upload_file, path, data) for path, data in uploads]
+        try:
+            if full_repo:
+                log.info("🔄 Cloning %s", REPO_URL)
+                result = _exec_script(workspace, f"rm -rf {workspace_dir} && mkdir -p {os.path.dirname(workspace_dir)}")
+                if not result or result.code != 0:
+                    # git clone refuses to write into a leftover non-empty directory
+                    code = getattr(result, "code", None)
+                    raise RemoteCommandError(f"Preparing the clone directory exited with code {code}", code, (result.result or "")[-500:] if result else "")
+                _retry(lambda: workspace.git.clone(REPO_URL, workspace_dir))
+        finally:
+            # Wait for every upload even if the clone failed, so none is still writing when cleanup runs
+            for upload in pending:
+                upload.exception()
+        for upload in pending:
+            upload.result()
+        log.info("✅ Uploaded bundle %s (%d bytes)", digest[:12], len(bundle))
+        if wheels:
+            log.info("✅ Uploaded wheelhouse %s (%d bytes)", wheels_digest[:12], len(wheels))
+
+        # Replace any existing directory with the bundle contents (or overlay the clone), verify them,
+        # then install everything; the directory listing is only worth producing when someone will read it
+        steps = [f"mkdir -p {workspace_dir}" if full_repo else f"rm -rf {workspace_dir} && mkdir -p {workspace_dir}"]
+        steps.append(f"tar -xzf {bundle_path} -C {workspace_dir}")
+        steps.append(f"install -m 600 {env_path} {workspace_dir}/.env")
+        steps.extend(f"test -f {workspace_dir}/{name}" for name in FILES_TO_COPY)
+        if log.isEnabledFor(logging.DEBUG):
+            steps.append(f"ls -la {workspace_dir}")
+
+        # Ship prebuilt wheels so pip installs from local files; wheels that don't match the
+        # workspace's platform are skipped by pip, which then falls back to PyPI for those packages
+        find_links = ""
+        if wheels:
+            steps.append(f"tar -xzf {wheels_path} -C {workspace_dir}")
+            find_links = f" --find-links={workspace_dir}/{WHEELHOUSE_NAME}"
+
+        # Additional packages are resolved together with requirements.txt so pip's resolver runs once
         additional_packages = ['litellm', 'python-dotenv', 'requests', 'anthropic', 'openai']
-        for package in additional_packages:
-            install_pkg_cmd = f"{venv_path}/bin/pip install {package}"
-            result = workspace.process.exec(install_pkg_cmd)
-            if result and result.result:
-                print(f"📦 Installed {package}:\n{result.result}")
-            else:
-                raise RuntimeError(f"Installation of {package} failed without output")
+        steps.append(f"python3 {workspace_dir}/get-pip.py")
+        steps.append(f"python3 -m venv {venv_path}")
+        steps.append(f"{venv_path}/bin/pip install --upgrade pip")
+        steps.append(
+            f"{venv_path}/bin/pip install --prefer-binary{find_links}"
+            f" -r {workspace_dir}/requirements.txt {' '.join(additional_packages)}"
+        )
+        # The bundle and wheels are removed only once everything succeeded, so a retried script can extract
+        # them again; the .env upload holds API keys, so the EXIT trap removes it whatever happens
+        steps.append(f"rm -f {' '.join(path for path, _ in uploads if path != env_path)}")
+        setup_script = f"trap {shlex.quote(f'rm -f {env_path}')} EXIT; " + " && ".join(steps)
+
+        log.info("\n🛠 Installing pip, setting up virtual environment and installing dependencies...")
+        retrying = False
+        def run_setup():
+            nonlocal retrying
+            if retrying:
+                # The previous attempt's EXIT trap has already removed the .env upload
+                workspace.fs.upload_file(env_path, env_content)
+            retrying = True
+            result = _exec_script(workspace, setup_script)
+            if not result or result.code != 0:
+                code = getattr(result, "code", None)
+                raise RemoteCommandError(f"Environment setup exited with code {code}", code, (result.result or "")[-500:] if result else "")
+            return result
+
+        result = _retry(run_setup)
+        if result.result:
+            log.info("📦 Environment setup output:\n%s", result.result)
+
+        log.info("✅ Successfully set up workspace at %s", workspace_dir)
+        return workspace_dir, venv_path
 
-        return True
-    except Exception as e:
-        print(f"❌ Dependencies installation failed: {e}")
-        traceback.print_exc()
-        return False
+    except Exception as setup_error:
+        log.error("❌ Workspace setup failed: %s", setup_error)
+        if getattr(setup_error, "output", ""):
+            log.error("%s", setup_error.output)
+        log.debug("Workspace setup traceback:", exc_info=True)
+        if env_path:
+            # The setup script may never have run, so its trap can't be relied on to remove the secrets
+            try:
+                workspace.process.exec(f"rm -f {env_path}")
+            except Exception as cleanup_error:
+                log.debug("Could not remove %s: %s", env_path, cleanup_error)
+        raise RuntimeError(f"Could not set up workspace: {str(setup_error)}")
 
 def run_babyagi(workspace, venv_path, workspace_dir, user_input):
     """
-    Run main.py within the virtual environment and capture output.
+    Run main.py within the virtual environment, printing its output as it is produced.
     """
     try:
-        print("\n🚀 Running BabyAGI...")
-        # Command to run main.py and redirect output to output.txt
-        run_cmd = f"{venv_path}/bin/python {workspace_dir}/main.py \"{user_input}\" > {workspace_dir}/output.txt 2>&1"
-        result = workspace.process.exec(run_cmd)
-        if result:
-            print("✅ BabyAGI execution command issued.")
-
-        # Wait for the script to finish
-        sleep(5)  # Adjust sleep time as needed
-
-        # Retrieve the output file
-        print("\n📥 Downloading BabyAGI output...")
-        output_content = workspace.fs.download_file(f"{workspace_dir}/output.txt")
-        if output_content:
-            output = output_content.decode('utf-8')
-            print("\n=== BabyAGI Output ===")
-            print(output)
-            return output
+        log.info("\n🚀 Running BabyAGI...")
+        # Pre-flight checks and the run itself go out as one script; the SDK only takes command strings,
+        # so the run is built as argv and joined with shlex, which quotes the task exactly once.
+        # Unbuffered output from main.py relative to an explicit cwd, so one attempt is enough
+        python = f"{venv_path}/bin/python"
+        run_script = (
+            f"test -x {python} && test -f main.py"
+            f" && {shlex.join([python, '-u', 'main.py', user_input])}"
+        )
+
+        log.info("\n=== BabyAGI Output ===")
+        chunks = []
+        def on_output(chunk):
+            chunks.append(chunk)
+            # Program output is passed through verbatim rather than as log records
+            sys.stdout.write(chunk)
+            sys.stdout.flush()
+
+        if _supports_session_streaming(workspace.process):
+            code = _stream_script(workspace, run_script, on_output, cwd=workspace_dir, timeout=RUN_TIMEOUT_SECONDS)
+            output = "".join(chunks)
         else:
-            raise RuntimeError("Failed to retrieve output.txt")
+            # Older SDKs only offer blocking exec; print everything once main.py exits
+            result = _retry(lambda: _exec_script(workspace, run_script, cwd=workspace_dir, timeout=RUN_TIMEOUT_SECONDS))
+            if not result:
+                raise RuntimeError("BabyAGI execution returned no response")
+            code, output = result.code, result.result or ""
+            log.info("%s", output)
+
+        # The exit code decides success; empty output from a clean exit is still a successful run
+        if code != 0:
+            raise RemoteCommandError(f"BabyAGI exited with code {code}", code)
+        return output
 
     except Exception as e:
-        print(f"❌ Running BabyAGI failed: {e}")
-        traceback.print_exc()
+        log.error("❌ Running BabyAGI failed: %s", e)
+        log.debug("Running BabyAGI traceback:", exc_info=True)
         return None
 
 def setup_environment(workspace, workspace_dir, user_input):
     """
     Set up environment variables by creating a .env file.
     """
+    staging_path = None
     try:
-        print("\n🔧 Setting up environment variables...")
-        env_vars = {
-            "OBJECTIVE": user_input or "Solve a complex problem",
-            "LITELLM_MODEL": os.getenv("LITELLM_MODEL", "gpt-4o-mini"),
-            "OPENAI_API_KEY": os.getenv("OPENAI_API_KEY", ""),
-            "ANTHROPIC_API_KEY": os.getenv("ANTHROPIC_API_KEY", ""),
-            "PYTHONUNBUFFERED": "1",
-            "PYTHONPATH": f"{workspace_dir}/venv/lib/python3.11/site-packages",
-            "PATH": f"{workspace_dir}/venv/bin:$PATH"
-        }
-
-        env_content = "\n".join([f"{key}={value}" for key, value in env_vars.items() if value])
-        env_path = f"{workspace_dir}/.env"
-        workspace.fs.upload_file(env_path, env_content.encode())
-        print(f"✅ Created .env file at {env_path}")
-
-        # Verify .env file
-        verify_env_cmd = f"cat {env_path}"
-        result = workspace.process.exec(verify_env_cmd)
-        if result and result.result:
-            print("\n📄 .env file contents:")
-            print(result.result)
-        else:
-            raise RuntimeError("Failed to verify .env file")
+        log.info("\n🔧 Setting up environment variables...")
+        # Staged and installed like in provision_workspace, so the API keys are never readable by other users
+        env_path, env_content = f"{workspace_dir}/.env", _env_file(workspace_dir, user_input)
+        staging_path = f"/tmp/babyagi-env-{secrets.token_hex(4)}"
+        workspace.fs.upload_file(staging_path, env_content)
+        install_script = f"trap {shlex.quote(f'rm -f {staging_path}')} EXIT; install -m 600 {staging_path} {env_path}"
+        result = _exec_script(workspace, install_script)
+        if not result or result.code != 0:
+            code = getattr(result, "code", None)
+            raise RemoteCommandError(f"Installing .env exited with code {code}", code, (result.result or "")[-500:] if result else "")
+        log.info("✅ Created .env file at %s", env_path)
+        # Only the variable names; the values are secrets
+        log.debug("\n📄 .env variables: %s", ", ".join(line.split("=", 1)[0] for line in env_content.decode().splitlines()))
 
         return True
 
     except Exception as e:
-        print(f"❌ Setting up environment variables failed: {e}")
-        traceback.print_exc()
+        log.error("❌ Setting up environment variables failed: %s", e)
+        log.debug("Setting up environment variables traceback:", exc_info=True)
+        if staging_path:
+            # The install script may never have run, so its trap can't be relied on to remove the secrets
+            try:
+                workspace.process.exec(f"rm -f {staging_path}")
+            except Exception as cleanup_error:
+                log.debug("Could not remove %s: %s", staging_path, cleanup_error)
         return False
 
-def setup_babyagi_workspace(user_input: str):
+def create_resilient_workspace(daytona_client):
+    """
+    Reuse the workspace named by DAYTONA_WORKSPACE_ID if there is one, otherwise create a Python workspace,
+    retrying transient Daytona failures.
+    Returns the workspace and whether it was created here (and so should be removed after the run).
+    """
+    workspace_id = _env_snapshot()["DAYTONA_WORKSPACE_ID"]
+    if workspace_id:
+        try:
+            workspace = _retry(lambda: daytona_client.get_current_workspace(workspace_id))
+            if workspace:
+                log.info("✅ Reusing existing workspace %s", workspace_id)
+                return workspace, False
+        except Exception as e:
+            log.warning("⚠️ Could not reuse workspace %s, creating a new one: %s", workspace_id, e)
+
+    log.info("\n🔄 Attempting Workspace Creation Strategy 1")
+    workspace = _retry(lambda: daytona_client.create(params=CreateWorkspaceParams(
+        language="python",
+        id=f"babyagi-{secrets.token_hex(4)}"
+    )))
+    if not workspace:
+        raise RuntimeError("Failed to create workspace with Strategy 1")
+    log.info("✅ Workspace created successfully with Strategy 1")
+    return workspace, True
+
+def setup_babyagi_workspace(user_input: str, full_repo: bool = False, *, reuse=None):
     """
     Set up BabyAGI workspace with comprehensive error handling.
+    Pass the result of an earlier call as reuse to run another task in the same, already provisioned workspace.
     """
+    daytona_client = created = None
     try:
-        # Create Daytona client
-        config = DaytonaConfig(
-            api_key=os.getenv("DAYTONA_API_KEY"),
-            server_url=os.getenv("DAYTONA_SERVER_URL"),
-            target=os.getenv("DAYTONA_TARGET", "local")
-        )
-        daytona_client = Daytona(config=config)
-
-        # Create workspace
-        print("\n🔄 Attempting Workspace Creation Strategy 1")
-        workspace = daytona_client.create(params=CreateWorkspaceParams(
-            language="python",
-            id=f"babyagi-{uuid.uuid4().hex[:8]}"
-        ))
-        if not workspace:
-            raise RuntimeError("Failed to create workspace with Strategy 1")
-        print("✅ Workspace created successfully with Strategy 1")
-
-        # Clone repository by uploading files
-        workspace_dir = clone_repository_with_fallbacks(workspace)
-
-        # Set up environment variables
-        if not setup_environment(workspace, workspace_dir, user_input):
-            raise RuntimeError("Failed to set up environment variables")
-
-        # Install pip
-        if not install_pip(workspace, workspace_dir):
-            raise RuntimeError("Failed to install pip")
-
-        # Set up virtual environment
-        venv_path = setup_virtualenv(workspace, workspace_dir)
-        if not venv_path:
-            raise RuntimeError("Failed to set up virtual environment")
-
-        # Install dependencies
-        if not install_dependencies(workspace, venv_path, workspace_dir):
-            raise RuntimeError("Failed to install dependencies")
+        if reuse:
+            # Provisioning is already done; only the objective in .env changes between tasks
+            daytona_client, workspace, owned = reuse["client"], reuse["workspace"], reuse["owned"]
+            workspace_dir, venv_path = reuse["path"], reuse["venv"]
+            if not setup_environment(workspace, workspace_dir, user_input):
+                raise RuntimeError("Failed to set up environment variables")
+        else:
+            # Create Daytona client
+            daytona_client = Daytona(config=_daytona_config())
+            _tune_http_pool(daytona_client)
+
+            # Create workspace
+            workspace, owned = create_resilient_workspace(daytona_client)
+            created = workspace if owned else None
+
+            # Upload files and .env, install pip and dependencies in one remote script
+            workspace_dir, venv_path = provision_workspace(workspace, user_input, full_repo)
 
         # Run BabyAGI
         output = run_babyagi(workspace, venv_path, workspace_dir, user_input)
 
         return {
+            "client": daytona_client,
             "workspace": workspace,
+            "owned": owned,
             "result": output,
-            "path": workspace_dir
+            "path": workspace_dir,
+            "venv": venv_path
         }
 
     except Exception as e:
         comprehensive_error_logging(e, "Workspace Setup")
+        if created is not None:
+            # No result reaches main(), so nothing else would remove the workspace created above
+            try:
+                log.info("\n🧹 Cleaning up workspace...")
+                daytona_client.remove(created)
+            except Exception as cleanup_error:
+                log.error("❌ Cleanup failed: %s", cleanup_error)
         return None
 
 def main():
     """
     Main execution function.
+    Set BABYAGI_KEEP_ALIVE=1 to keep the workspace and read further tasks until an empty line.
     """
     try:
-        # Validate environment
-        if not os.path.exists(".env"):
-            print("❌ Error: .env file not found in the current directory")
+        # Load environment variables; load_dotenv reports whether .env existed and set anything
+        if not load_dotenv(".env", override=True):
+            log.error("❌ Error: .env file not found or empty in the current directory")
+            return
+        missing = [key for key in REQUIRED_ENV_KEYS if not _env_snapshot()[key]]
+        if missing:
+            log.error("❌ Error: missing required environment variables: %s", ", ".join(missing))
             return
-
-        # Load environment variables
-        load_dotenv(override=True)
 
         # Get user input
-        user_input = " ".join(sys.argv[1:]) if len(sys.argv) > 1 else input("🤔 Enter your task for BabyAGI: ")
+        args = sys.argv[1:]
+        full_repo = "--full-repo" in args
+        args = [arg for arg in args if arg != "--full-repo"]
+        user_input = " ".join(args) if args else input("🤔 Enter your task for BabyAGI: ")
+        keep_alive = os.getenv("BABYAGI_KEEP_ALIVE") == "1"
 
         # Run BabyAGI
-        result = setup_babyagi_workspace(user_input)
+        result = setup_babyagi_workspace(user_input, full_repo)
 
         if result:
+            # run_babyagi prints BabyAGI's output as it runs, so it isn't repeated here
             workspace = result["workspace"]
-            output = result["result"]
-
-            # Display the output
-            if output:
-                print("\n🤖 BabyAGI Output:")
-                print(output)
+            # run_babyagi returns None when main.py failed, while the workspace itself is still usable
+            succeeded = result["result"] is not None
+            if not succeeded:
+                log.error("❌ BabyAGI execution failed")
 
             try:
-                # Cleanup
-                print("\n🧹 Cleaning up workspace...")
-                daytona_client = Daytona().client  # Assuming Daytona can remove the workspace
-                daytona_client.remove(workspace)
-                print("✅ Task completed successfully!")
-            except Exception as e:
-                print(f"❌ Cleanup failed: {e}")
+                # Later tasks run in the same workspace, skipping creation and dependency installs
+                while keep_alive:
+                    try:
+                        user_input = input("\n🤔 Enter another task for BabyAGI (empty to exit): ").strip()
+                    except EOFError:
+                        break
+                    if not user_input:
+                        break
+                    next_result = setup_babyagi_workspace(user_input, reuse=result)
+                    if not next_result or next_result["result"] is None:
+                        log.error("❌ BabyAGI execution failed")
+                        succeeded = False
+            finally:
+                if not result["owned"]:
+                    # Workspaces reused via DAYTONA_WORKSPACE_ID belong to the user; leave them running
+                    if succeeded:
+                        log.info("✅ Task completed successfully!")
+                else:
+                    try:
+                        # Cleanup with the client that created the workspace, reusing its connection
+                        log.info("\n🧹 Cleaning up workspace...")
+                        result["client"].remove(workspace)
+                        if succeeded:
+                            log.info("✅ Task completed successfully!")
+                    except Exception as e:
+                        log.error("❌ Cleanup failed: %s", e)
         else:
-            print("❌ BabyAGI execution failed")
+            log.error("❌ BabyAGI execution failed")
 
     except Exception as e:
         comprehensive_error_logging(e, "Main Execution")
@@ -0,0 +1,62 @@
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("litellm")
+pytest.importorskip("orjson")
+pytest.importorskip("httpx")
+
+import main
+
+JITTER = 0.25
+
+
+def rate_limit_error(**headers):
+    return SimpleNamespace(response=SimpleNamespace(headers=headers))
+
+
+@pytest.mark.parametrize("value, expected", [
+    ("1s", 1), ("20ms", 0.02), ("6m0s", 360), ("1.5s", 1.5), ("1h2m", 3720),
+])
+def test_parse_reset_duration(value, expected):
+    assert main.parse_reset_duration(value) == pytest.approx(expected)
+
+
+def test_parse_reset_duration_rejects_garbage():
+    assert main.parse_reset_duration("soon") is None
+
+
+def test_retry_after_seconds():
+    assert 2 <= main.rate_limit_delay(rate_limit_error(**{"retry-after": "2"})) <= 2 + JITTER
+
+
+def test_retry_after_http_date():
+    when = format_datetime(datetime.now(timezone.utc) + timedelta(seconds=30), usegmt=True)
+    assert 28 <= main.rate_limit_delay(rate_limit_error(**{"retry-after": when})) <= 30 + JITTER
+
+
+def test_retry_after_in_the_past_does_not_wait():
+    when = format_datetime(datetime.now(timezone.utc) - timedelta(minutes=5), usegmt=True)
+    assert 0 <= main.rate_limit_delay(rate_limit_error(**{"retry-after": when})) <= JITTER
+
+
+def test_reset_headers_are_used_without_retry_after():
+    error = rate_limit_error(**{"x-ratelimit-reset-requests": "garbage", "x-ratelimit-reset-tokens": "1.5s"})
+    assert 1.5 <= main.rate_limit_delay(error) <= 1.5 + JITTER
+
+
+@pytest.mark.parametrize("headers", [{"retry-after": "3600"}, {"x-ratelimit-reset-tokens": "2h"}])
+def test_wait_is_capped(headers):
+    delay = main.rate_limit_delay(rate_limit_error(**headers))
+    assert main.MAX_RATE_LIMIT_WAIT_SECONDS <= delay <= main.MAX_RATE_LIMIT_WAIT_SECONDS + JITTER
+
+
+def test_default_wait_without_headers():
+    assert 1 <= main.rate_limit_delay(Exception("rate limited")) <= 1 + JITTER
+
+
+def test_error_backoff_doubles_up_to_the_cap():
+    assert [main.error_backoff(n) for n in range(4)] == [0.25, 0.5, 1, 2]
+    assert main.error_backoff(20) == main.MAX_BACKOFF_SECONDS
@@ -0,0 +1,94 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("litellm")
+
+import litellm_cache
+
+
+class FakeResponse:
+    def __init__(self, payload):
+        self.payload = payload
+
+    def model_dump(self):
+        return self.payload
+
+
+def tool_call_response(call_id):
+    return {"choices": [{"message": {"role": "assistant", "content": None, "tool_calls": [
+        {"id": call_id, "type": "function", "function": {"name": "echo", "arguments": "{}"}}
+    ]}}]}
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(litellm_cache, "CACHE_ENABLED", True)
+    monkeypatch.setattr(litellm_cache, "CACHE_PATH", str(tmp_path / "cache.sqlite"))
+    monkeypatch.setattr(litellm_cache, "_connection", None)
+    monkeypatch.setattr(litellm_cache, "_embed", lambda text: [1.0, 0.0])
+    yield litellm_cache
+    if litellm_cache._connection is not None:
+        litellm_cache._connection.close()
+
+
+TOOLS = [{"type": "function", "function": {"name": "echo", "parameters": {}}}]
+
+
+def test_scope_ignores_tool_call_ids_and_the_last_message():
+    first = [{"role": "user", "content": "hi"},
+             {"role": "assistant", "content": None, "tool_calls": [{"id": "call_a", "function": {"name": "echo", "arguments": "{}"}}]},
+             {"role": "user", "content": "again"}]
+    second = [dict(first[0]),
+              {"role": "assistant", "content": None, "tool_calls": [{"id": "call_b", "function": {"name": "echo", "arguments": "{}"}}]},
+              {"role": "user", "content": "something else"}]
+    assert litellm_cache._scope(first, TOOLS, "model") == litellm_cache._scope(second, TOOLS, "model")
+
+
+def test_scope_separates_models_tools_and_histories():
+    messages = [{"role": "user", "content": "hi"}, {"role": "user", "content": "go"}]
+    scope = litellm_cache._scope(messages, TOOLS, "model")
+    assert scope != litellm_cache._scope(messages, TOOLS, "other-model")
+    assert scope != litellm_cache._scope(messages, TOOLS, "model", tools_key="changed-schemas")
+    assert scope != litellm_cache._scope([{"role": "user", "content": "bye"}, messages[1]], TOOLS, "model")
+
+
+def test_replay_hands_out_fresh_tool_call_ids():
+    payload = tool_call_response("call_original")
+    litellm_cache._replay(payload)
+    first_id = payload["choices"][0]["message"]["tool_calls"][0]["id"]
+    litellm_cache._replay(payload)
+    second_id = payload["choices"][0]["message"]["tool_calls"][0]["id"]
+    assert first_id.startswith("call_") and first_id != "call_original"
+    assert second_id != first_id
+
+
+def test_hit_is_served_from_the_cache(cache, monkeypatch):
+    replayed = []
+    monkeypatch.setattr(cache, "_replay", lambda payload: replayed.append(payload) or payload)
+    calls = []
+    def complete(**kwargs):
+        calls.append(kwargs)
+        return FakeResponse(tool_call_response("call_live"))
+    messages = [{"role": "user", "content": "hi"}]
+    cache.cached_completion(messages, TOOLS, "model", complete=complete)
+    cache.cached_completion(messages, TOOLS, "model", complete=complete)
+    assert len(calls) == 1
+    assert len(replayed) == 1
+
+
+def test_miss_in_another_scope_calls_the_model(cache):
+    calls = []
+    def complete(**kwargs):
+        calls.append(kwargs)
+        return FakeResponse(tool_call_response("call_live"))
+    cache.cached_completion([{"role": "user", "content": "hi"}], TOOLS, "model", complete=complete)
+    cache.cached_completion([{"role": "user", "content": "hi"}], TOOLS, "other-model", complete=complete)
+    assert len(calls) == 2
+
+
+def test_disabled_cache_passes_through(monkeypatch):
+    monkeypatch.setattr(litellm_cache, "CACHE_ENABLED", False)
+    async def complete(**kwargs):
+        return kwargs["model"]
+    assert asyncio.run(litellm_cache.acached_completion([], TOOLS, "model", complete=complete)) == "model"
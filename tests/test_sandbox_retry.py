@@ -0,0 +1,73 @@
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("requests")
+pytest.importorskip("dotenv")
+pytest.importorskip("daytona_sdk")
+
+import sandbox
+
+
+class StatusError(Exception):
+    def __init__(self, status_code):
+        super().__init__("request failed")
+        self.status_code = status_code
+
+
+@pytest.mark.parametrize("message", [
+    "HTTP 503 Service Unavailable",
+    "status 429: slow down",
+    "Bad gateway (502)",
+    "Too Many Requests",
+    "Connection reset by peer",
+    "operation timed out",
+])
+def test_transient_messages(message):
+    assert sandbox._is_transient(Exception(message))
+
+
+@pytest.mark.parametrize("message", [
+    "pip 25.0.1 requires version 1.502.3",
+    "listening on port 5040",
+    "error429x",
+    "No such file or directory",
+])
+def test_fatal_messages(message):
+    assert not sandbox._is_transient(Exception(message))
+
+
+@pytest.mark.parametrize("status, transient", [(429, True), (500, True), (502, True), (404, False), (401, False)])
+def test_status_codes(status, transient):
+    assert sandbox._is_transient(StatusError(status)) is transient
+    response_error = Exception("failed")
+    response_error.response = SimpleNamespace(status_code=status)
+    assert sandbox._is_transient(response_error) is transient
+
+
+def test_remote_command_errors_are_never_transient():
+    error = sandbox.RemoteCommandError("setup exited with code 1", 1, "HTTP 503 while downloading")
+    assert not sandbox._is_transient(error)
+
+
+def test_retry_retries_transient_failures(monkeypatch):
+    monkeypatch.setattr(sandbox.time, "sleep", lambda seconds: None)
+    attempts = []
+    def flaky():
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise Exception("503 Service Unavailable")
+        return "ok"
+    assert sandbox._retry(flaky) == "ok"
+    assert len(attempts) == 3
+
+
+def test_retry_gives_up_on_fatal_failures(monkeypatch):
+    monkeypatch.setattr(sandbox.time, "sleep", lambda seconds: None)
+    attempts = []
+    def broken():
+        attempts.append(1)
+        raise ValueError("bad request")
+    with pytest.raises(ValueError):
+        sandbox._retry(broken)
+    assert len(attempts) == 1
@@ -0,0 +1,85 @@
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("requests")
+pytest.importorskip("dotenv")
+pytest.importorskip("daytona_sdk")
+
+import sandbox
+
+
+class FakeProcess:
+    """
+    A session API whose log stream replays the command's output from the start on every connection.
+    """
+    def __init__(self, streams, exit_codes=(0,)):
+        self.streams = list(streams)
+        self.exit_codes = list(exit_codes)
+        self.executed, self.deleted = [], []
+
+    def create_session(self, session_id):
+        pass
+
+    def execute_session_command(self, session_id, request):
+        self.executed.append(request.command)
+        return SimpleNamespace(cmd_id="cmd")
+
+    async def get_session_command_logs_async(self, session_id, cmd_id, on_logs):
+        chunks, error = self.streams.pop(0)
+        for chunk in chunks:
+            on_logs(chunk)
+        if error:
+            raise error
+
+    def get_session_command(self, session_id, cmd_id):
+        code = self.exit_codes.pop(0) if len(self.exit_codes) > 1 else self.exit_codes[0]
+        return SimpleNamespace(exit_code=code)
+
+    def delete_session(self, session_id):
+        self.deleted.append(session_id)
+
+
+@pytest.fixture(autouse=True)
+def session_api(monkeypatch):
+    monkeypatch.setattr(sandbox, "SessionExecuteRequest", lambda **kwargs: SimpleNamespace(**kwargs))
+    monkeypatch.setattr(sandbox.time, "sleep", lambda seconds: None)
+
+
+def stream(process, **kwargs):
+    output = []
+    code = sandbox._stream_script(SimpleNamespace(process=process), "python main.py", output.append, **kwargs)
+    return code, "".join(output)
+
+
+def test_output_is_forwarded_once_across_reconnects():
+    process = FakeProcess([
+        (["hel", "lo "], ConnectionError("connection reset by peer")),
+        (["hello ", "wor"], ConnectionError("connection reset by peer")),
+        (["hello world", "!"], None),
+    ])
+    assert stream(process) == (0, "hello world!")
+    # The script itself ran once; only the log stream was reopened
+    assert len(process.executed) == 1
+    assert len(process.deleted) == 1
+
+
+def test_exit_code_is_polled_until_recorded():
+    process = FakeProcess([(["done"], None)], exit_codes=(None, None, 3))
+    assert stream(process) == (3, "done")
+
+
+def test_fatal_stream_errors_are_not_reconnected():
+    process = FakeProcess([([], PermissionError("forbidden")), (["never"], None)])
+    with pytest.raises(PermissionError):
+        stream(process)
+    assert len(process.streams) == 1
+    assert len(process.deleted) == 1
+
+
+def test_reconnects_are_bounded():
+    drop = ConnectionError("connection reset by peer")
+    process = FakeProcess([(["x"], drop)] * 3)
+    with pytest.raises(ConnectionError):
+        stream(process, reconnects=2)
+    assert len(process.deleted) == 1
@@ -0,0 +1,52 @@
+import json
+
+import pytest
+
+pytest.importorskip("litellm")
+pytest.importorskip("orjson")
+pytest.importorskip("httpx")
+
+import main
+
+
+def test_short_results_are_plain_json():
+    assert json.loads(main.serialize_tool_result({"a": [1, 2]})) == {"a": [1, 2]}
+
+
+def test_long_strings_are_cut_before_encoding():
+    result = main.serialize_tool_result("a" * 100_000, max_length=10)
+    assert result.startswith('"aaaaaaaaa\n')
+    assert "truncated to 10 characters" in result
+
+
+def test_unknown_objects_fall_back_to_str():
+    class Thing:
+        def __str__(self):
+            return "thing"
+    assert main.serialize_tool_result([Thing()]) == '["thing"]'
+
+
+def test_non_string_keys_use_the_incremental_encoder():
+    assert main.serialize_tool_result({1: "x"}) == '{"1": "x"}'
+
+
+def test_incremental_encoder_stops_past_the_limit():
+    result = main.serialize_tool_result({i: "x" * 50 for i in range(10_000)}, max_length=100)
+    assert result.startswith('{"0": "xxx')
+    assert "truncated to 100 characters" in result
+
+
+def test_circular_results_fall_back_to_repr():
+    circular = []
+    circular.append(circular)
+    result = main.serialize_tool_result(circular)
+    assert result.startswith("[[") and "..." in result
+
+
+def test_repr_fallback_still_fills_the_budget():
+    circular = [list(range(1000))]
+    circular.append(circular)
+    result = main.serialize_tool_result(circular, max_length=200)
+    # reprlib's default limits would stop after six items
+    assert "0, 1, 2, 3, 4, 5, 6" in result
+    assert "truncated to 200 characters" in result
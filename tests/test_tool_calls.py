@@ -0,0 +1,62 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("litellm")
+pytest.importorskip("orjson")
+pytest.importorskip("httpx")
+
+import main
+
+
+def tool_call(call_id, name, arguments="{}"):
+    return SimpleNamespace(id=call_id, function=SimpleNamespace(name=name, arguments=arguments))
+
+
+@pytest.fixture
+def executor():
+    pool = ThreadPoolExecutor(max_workers=1)
+    yield pool
+    pool.shutdown(wait=True)
+
+
+def test_cancel_started_waits_for_running_calls_and_drops_queued_ones(executor):
+    release, ran = threading.Event(), []
+    def running():
+        release.wait(5)
+        ran.append("running")
+    started = {"a": executor.submit(running), "b": executor.submit(ran.append, "queued")}
+
+    async def cancel():
+        cancelling = asyncio.ensure_future(main.cancel_started(started))
+        await asyncio.sleep(0.05)
+        # The running call holds cancel_started until its thread is done
+        assert not cancelling.done()
+        release.set()
+        await cancelling
+
+    asyncio.run(cancel())
+    assert ran == ["running"]
+    assert started == {}
+
+
+def test_execute_tool_calls_keeps_order_and_reuses_started_calls(executor, monkeypatch):
+    monkeypatch.setitem(main.available_functions, "echo", lambda text: text)
+    calls = [tool_call("1", "echo", '{"text": "first"}'), tool_call("2", "echo", '{"text": "second"}')]
+    started = {"1": executor.submit(lambda: "started early")}
+    results = asyncio.run(main.execute_tool_calls(calls, executor, started))
+    assert [(tc.id, result) for tc, result in results] == [("1", "started early"), ("2", "second")]
+
+
+def test_early_dispatch_stops_at_main_thread_tools(executor, monkeypatch):
+    monkeypatch.setitem(main.available_functions, "echo", lambda text: text)
+    started = {}
+    dispatch = main.early_tool_dispatcher(started, executor)
+    dispatch("1", "echo", {"text": "a"})
+    dispatch("2", "create_or_update_tool", {})
+    dispatch("3", "echo", {"text": "b"})
+    assert list(started) == ["1"]
+    assert started["1"].result(5) == "a"